@@ -1,17 +1,123 @@
 import pandas as pd
 import json
-import asyncio
 from datetime import datetime
-import time
 import os
 
 from nba_api.stats.static.players import find_players_by_full_name
 from nba_api.stats.endpoints.commonplayerinfo import CommonPlayerInfo
-from nba_api.stats.endpoints.playergamelog import PlayerGameLog
 from nba_api.stats.endpoints.playercareerstats import PlayerCareerStats
 
+from const import UPSTREAM_TIMEOUT_SECONDS, PLAYER_INFO_TTL, CAREER_STATS_TTL
+from fetch_policy import NBA_API_POLICY, NBA_API_RATE_LIMITER, Deadline, UpstreamUnavailable
+from gamelog_store import GAMELOG_STORE
+
+def fetch_player_info(key: tuple):
+    NBA_API_RATE_LIMITER.wait()
+    cpi_frames: list[pd.DataFrame] = CommonPlayerInfo(key[1], timeout=UPSTREAM_TIMEOUT_SECONDS).get_data_frames()
+    return cpi_frames[0]
+
+def fetch_career_stats(key: tuple):
+    """
+    https://github.com/swar/nba_api/blob/master/docs/nba_api/stats/endpoints_output/playercareerstats_output.md
+    """
+    NBA_API_RATE_LIMITER.wait()
+    frames = PlayerCareerStats(key[1], timeout=UPSTREAM_TIMEOUT_SECONDS).get_data_frames()
+    return {
+        'season_totals_regular_season': frames[0],
+        'career_totals_regular_season': frames[1],
+        'season_totals_post_season': frames[2],
+        'career_totals_post_season': frames[3],
+        'season_rankings_regular_season': frames[10],
+        'season_rankings_post_season': frames[11]
+    }
+
+# NBA_API_POLICY key type -> (fetcher, ttl)
+PLAYER_FETCHERS = {
+    'player_info': (fetch_player_info, PLAYER_INFO_TTL),
+    'career_stats': (fetch_career_stats, CAREER_STATS_TTL)
+}
+
+def fetch_player_data(key: tuple):
+    return PLAYER_FETCHERS[key[0]][0](key)
+
+def get_player_data_ttl(key: tuple):
+    return PLAYER_FETCHERS[key[0]][1]
+
+def get_seasons(career_stats: dict[pd.DataFrame]):
+    """
+    Last 2 seasons active in NBA
+    """
+    seasons = career_stats['season_totals_regular_season']['SEASON_ID'].values
+    seasons: list[int] = list(set([int(s.split("-")[0]) for s in seasons]))
+    seasons.sort()
+    return seasons[-2:]
+
+def get_players_entries(player_ids: list, deadline: Deadline = None):
+    """
+    NBA_API_POLICY entries (value, fetched_at, seq) PlayerDataObjs are built from, for many players at once.
+    Every player's player_info + career_stats fetches start together, then every player's gamelogs,
+    all waiting on the one deadline.
+    Returns ({ player_id: entries }, { player_id: error message }) - errors for players upstream couldn't serve
+    """
+    player_keys = { pid: (('player_info', int(pid)), ('career_stats', int(pid))) for pid in player_ids }
+    res, errors = NBA_API_POLICY.get_many_partial(
+        [key for keys in player_keys.values() for key in keys], fetch_player_data, get_player_data_ttl, deadline
+    )
+    players, player_errors = {}, {}
+    for pid, (info_key, career_key) in player_keys.items():
+        if info_key in errors or career_key in errors:
+            player_errors[pid] = errors.get(info_key) or errors.get(career_key)
+            continue
+        players[pid] = {
+            'player_info': res[info_key],
+            'career_stats': res[career_key],
+            'gamelog_keys': GAMELOG_STORE.get_player_keys(pid, get_seasons(res[career_key][0]))
+        }
+    gamelog_res, gamelog_errors = GAMELOG_STORE.get_entries_partial(
+        [key for entries in players.values() for key in entries['gamelog_keys']], deadline
+    )
+    for pid in list(players.keys()):
+        entries = players[pid]
+        failed = [gamelog_errors[key] for key in entries['gamelog_keys'] if key in gamelog_errors]
+        if failed:
+            player_errors[pid] = failed[0]
+            del players[pid]
+            continue
+        entries['gamelogs'] = { key: gamelog_res[key] for key in entries['gamelog_keys'] }
+    return players, player_errors
+
+def get_player_entries(player_id, deadline: Deadline = None):
+    """
+    get_players_entries for one player, raises UpstreamUnavailable when something
+    isn't cached and can't be fetched within deadline
+    """
+    players, errors = get_players_entries([player_id], deadline)
+    if errors:
+        raise UpstreamUnavailable(errors[player_id])
+    return players[player_id]
+
+def get_gamelogs_version(entries: dict):
+    """
+    Fetch seqs of the gamelog entries only, for data derived from gamelogs alone
+    """
+    return tuple(entries['gamelogs'][key][2] for key in entries['gamelog_keys'])
+
+def get_entries_version(entries: dict):
+    """
+    Fetch seqs of every entry, changes whenever any of them is refreshed
+    """
+    return (
+        entries['player_info'][2],
+        entries['career_stats'][2]
+    ) + get_gamelogs_version(entries)
+
 class PlayerDataObj:
-    def __init__(self, player_id, save: bool = False, load: bool = False):
+    def __init__(self, player_id, save: bool = False, load: bool = False, deadline: Deadline = None, entries: dict = None):
+        """
+        nba_api data is served through NBA_API_POLICY (or prefetched entries from get_player_entries),
+        raises UpstreamUnavailable when something isn't cached and can't be fetched within deadline.
+        all_gamelogs is None when the player has no gamelogs
+        """
         self.player_id = player_id
         self.data_dir = "./data/"
         if load: # from local
@@ -27,17 +133,22 @@ class PlayerDataObj:
             self.all_gamelogs: pd.DataFrame = pd.read_csv(f"{self.data_dir}all_gamelogs.csv")
             self.all_gamelogs['GAME_DATE'] = self.all_gamelogs['GAME_DATE'].apply(lambda x: datetime.strptime(x, "%Y-%m-%d").date())
         else: # from nba_api
+            if entries is None:
+                entries = get_player_entries(player_id, deadline)
+            # cached frames are shared between requests, copy before use (BetResponseObj adds columns)
             # set player_info_df (position, name draft_year, etc.)
-            self.player_info_df: pd.DataFrame = self.get_player_info()
+            self.player_info_df: pd.DataFrame = entries['player_info'][0].copy()
             # career stats
-            self.career_stats: dict[pd.DataFrame] = self.get_career_stats()
+            self.career_stats: dict[pd.DataFrame] = { key: df.copy() for key, df in entries['career_stats'][0].items() }
             # seasons active in NBA
-            self.seasons: list[int] = self.get_seasons()
-            # set all gamelogs
-            self.all_gamelogs: pd.DataFrame = asyncio.run(self.get_all_gamelogs(self.seasons, self.player_id))
-            # convert + sort by GAME_DATEs
-            self.all_gamelogs['GAME_DATE'] = self.all_gamelogs['GAME_DATE'].apply(lambda x: datetime.strptime(x, "%b %d, %Y").date())
-            self.all_gamelogs = self.all_gamelogs.sort_values(by=['GAME_DATE'], ascending=False)
+            self.seasons: list[int] = get_seasons(self.career_stats)
+            # set all gamelogs (shared store, concat makes a new frame)
+            frames = { key: entry[0] for key, entry in entries['gamelogs'].items() }
+            self.all_gamelogs: pd.DataFrame = GAMELOG_STORE.concat_player_gamelogs(self.player_id, entries['gamelog_keys'], frames)
+            if self.all_gamelogs is not None:
+                # convert + sort by GAME_DATEs
+                self.all_gamelogs['GAME_DATE'] = self.all_gamelogs['GAME_DATE'].apply(lambda x: datetime.strptime(x, "%b %d, %Y").date())
+                self.all_gamelogs = self.all_gamelogs.sort_values(by=['GAME_DATE'], ascending=False)
         # save locally for testing
         if save:
             self.write_locally()
@@ -50,71 +161,23 @@ class PlayerDataObj:
         json.dump(self.seasons, open(f"{self.data_dir}{self.player_id}_seasons.json", "w"))
         self.all_gamelogs.to_csv(f"{self.data_dir}{self.player_id}_all_gamelogs.csv", index=False)
         return
-    def get_player_info(self):
-        cpi_frames: list[pd.DataFrame] = CommonPlayerInfo(self.player_id).get_data_frames()
-        time.sleep(0.6)
-        return cpi_frames[0]
-    def get_career_stats(self):
+    def as_json(self):
         """
-        https://github.com/swar/nba_api/blob/master/docs/nba_api/stats/endpoints_output/playercareerstats_output.md
+        Serialize without touching self.__dict__, DataFrames are written with to_json
+        and spliced in directly instead of a to_json/json.loads round trip
         """
-        frames = PlayerCareerStats(self.player_id).get_data_frames()
-        time.sleep(0.6)
-        return {
-            'season_totals_regular_season': frames[0],
-            'career_totals_regular_season': frames[1],
-            'season_totals_post_season': frames[2],
-            'career_totals_post_season': frames[3],
-            'season_rankings_regular_season': frames[10],
-            'season_rankings_post_season': frames[11]
-        }
-    def get_seasons(self):
-        seasons = self.career_stats['season_totals_regular_season']['SEASON_ID'].values
-        seasons: list[int] = list(set([int(s.split("-")[0]) for s in seasons]))
-        seasons.sort()
-        return seasons[-2:]
-    async def get_gamelog_reg(self, season: int, player_id: int):
-        # regular
-        reg_df: pd.DataFrame = PlayerGameLog(player_id, season, r"Regular Season").get_data_frames()[0]
-        reg_df.insert(0, 'SEASON', season)
-        reg_df.insert(1, 'SEASON_TYPE', 'regular')
-        if not reg_df.empty:
-            time.sleep(0.6)
-            return reg_df
-        return None
-    async def get_gamelog_post(self, season: int, player_id: int):
-        # post
-        post_df: pd.DataFrame = PlayerGameLog(player_id, season, r"Playoffs").get_data_frames()[0]
-        post_df.insert(0, 'SEASON', season)
-        post_df.insert(1, 'SEASON_TYPE', 'post')
-        if not post_df.empty:
-            time.sleep(0.6)
-            return post_df
-        return None
-    async def get_all_gamelogs(self, seasons: list[int], player_id: int):
-        # Using asyncio.gather and a list comprehension
-        reg = await asyncio.gather(*(self.get_gamelog_reg(s, player_id) for s in seasons))
-        reg_df = pd.concat([r for r in reg if r is not None])
-        post = await asyncio.gather(*(self.get_gamelog_post(s, player_id) for s in seasons))
-        post_df = pd.concat([r for r in post if r is not None])
-        try:
-            df = pd.concat([reg_df, post_df])
-            df['is_home'] = ~df['MATCHUP'].str.contains('@')
-            return df
-        except ValueError:
-            print(f"No gamelogs found for {self.player_id}")
-            return None
+        parts = []
+        for key, value in self.__dict__.items():
+            if type(value) is pd.DataFrame:
+                encoded = value.to_json(orient='records')
+            elif type(value) is dict:
+                encoded = "{" + ",".join(f"{json.dumps(k)}:{v.to_json(orient='records')}" for k, v in value.items()) + "}"
+            else:
+                encoded = json.dumps(value)
+            parts.append(f"{json.dumps(key)}:{encoded}")
+        return "{" + ",".join(parts) + "}"
     def as_dict(self):
-        data = self.__dict__
-        for key in data:
-            if type(data[key]) is pd.DataFrame:
-                data[key] = json.loads(data[key].to_json(orient='records'))
-            if type(data[key]) is dict:
-                temp_data = data[key]
-                for key_1 in temp_data:
-                    temp_data[key_1] = json.loads(temp_data[key_1].to_json(orient='records'))
-                data[key] = temp_data
-        return data
+        return json.loads(self.as_json())
 # END PlayerDataObj
 
 # if __name__ == "__main__":
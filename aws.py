@@ -11,4 +11,17 @@ def get_props_by_date(league: str, date: datetime):
             FROM {league}_props 
             WHERE bovada_date >= '{date}'
         """
+    )
+
+def get_props_downloaded_since(league: str, date: datetime, since: str):
+    """
+    Rows downloaded at or after since (DATETIME_FORMAT strings sort chronologically),
+    >= so rows written later with the same timestamp aren't skipped, the caller drops unchanged lines
+    """
+    return wr.dynamodb.read_partiql_query(
+        query=f"""
+            SELECT *
+            FROM {league}_props 
+            WHERE bovada_date >= '{date}' AND date_downloaded >= '{since}'
+        """
     )
\ No newline at end of file
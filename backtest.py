@@ -0,0 +1,200 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from const import DATETIME_FORMAT
+from aws import get_dynamo_table_dataframe
+
+# props/outcomes are matched on game, player and stat (+ line_value when outcomes record it)
+JOIN_KEYS = ['id', 'player_id', 'stat']
+
+# default rule grid, every (side, window) pair is evaluated over all thresholds in one pass
+DEFAULT_SIDES = ['over', 'under']
+DEFAULT_WINDOWS = [5, 10, 20]
+DEFAULT_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9]
+
+def american_odds_profit(odds: np.ndarray):
+    """
+    Profit of a winning 1 unit stake at american odds, -110 -> 0.909, +150 -> 1.5
+    odds between -100 and +100 aren't valid american odds, nan
+    """
+    odds = odds.astype(float)
+    with np.errstate(divide='ignore'):
+        profit = np.where(odds > 0, odds / 100.0, 100.0 / np.abs(odds))
+    return np.where(np.abs(odds) >= 100, profit, np.nan)
+
+def group_starts(codes: np.ndarray):
+    """
+    Index of the first row of each row's group, codes must be sorted
+    """
+    n = len(codes)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if n else np.array([], dtype=int)
+    return np.repeat(starts, np.diff(np.r_[starts, n]))
+
+def prior_hit_rate(hits: np.ndarray, starts: np.ndarray, window: int):
+    """
+    Hit rate over (up to) the previous window rows of the same group, excluding the row itself
+    Returns (rate, games) - rate is nan when there are no prior games
+    """
+    csum = np.r_[0, np.cumsum(hits)]
+    idx = np.arange(len(hits))
+    games = np.minimum(idx - starts, window)
+    prior = csum[idx] - csum[idx - games]
+    rate = np.full(len(hits), np.nan)
+    np.divide(prior, games, out=rate, where=games > 0)
+    return rate, games
+
+def evaluate_partition(league: str, stat: str, arrays: dict, rules: list[tuple]):
+    """
+    Runs in a worker process, arrays are sorted by (player, date)
+    rules: [(side, window, min_games, thresholds)]
+    """
+    outcome: np.ndarray = arrays['outcome']
+    starts = group_starts(arrays['player_code'])
+    res = []
+    for side, window, min_games, thresholds in rules:
+        other_side = 'under' if side == 'over' else 'over'
+        won = outcome == side
+        lost = outcome == other_side
+        odds: np.ndarray = arrays[f"{side}_odds"]
+        rate, games = prior_hit_rate(won.astype(np.int64), starts, window)
+        # missing or malformed (0, -100 < odds < +100) odds are never bet
+        with np.errstate(invalid='ignore'):
+            has_odds = np.abs(odds) >= 100
+        profit = np.where(won, american_odds_profit(np.where(has_odds, odds, -100.0)), np.where(lost, -1.0, 0.0))
+        eligible = (games >= min_games) & has_odds
+        # rows x thresholds
+        with np.errstate(invalid='ignore'):
+            selected = eligible[:, None] & (rate[:, None] >= np.asarray(thresholds)[None, :])
+        bets = selected.sum(axis=0)
+        wins = (selected & won[:, None]).sum(axis=0)
+        losses = (selected & lost[:, None]).sum(axis=0)
+        units = profit @ selected
+        for i, threshold in enumerate(thresholds):
+            res.append({
+                'league': league,
+                'stat': stat,
+                'side': side,
+                'window': window,
+                'threshold': threshold,
+                'bets': int(bets[i]),
+                'wins': int(wins[i]),
+                'losses': int(losses[i]),
+                'pushes': int(bets[i] - wins[i] - losses[i]),
+                'hit_rate': round(wins[i] / bets[i] * 100.0, 2) if bets[i] else None,
+                'units': round(float(units[i]), 2),
+                'roi': round(float(units[i]) / bets[i] * 100.0, 2) if bets[i] else None
+            })
+    return res
+
+def make_rules(sides: list[str] = DEFAULT_SIDES, windows: list[int] = DEFAULT_WINDOWS, thresholds: list[float] = DEFAULT_THRESHOLDS, min_games: int = None):
+    """
+    "<side> when last-<window> <side> hit rate >= threshold", min_games defaults to a full window
+    """
+    return [(side, window, min_games or window, list(thresholds)) for side in sides for window in windows]
+
+class Backtest:
+    def __init__(self, leagues: list[str], local: bool = True, start_date: str = None, end_date: str = None):
+        self.leagues = leagues
+        self.local = local
+        self.start_date = pd.to_datetime(start_date) if start_date else None
+        self.end_date = pd.to_datetime(end_date) if end_date else None
+        return
+    def get_props(self, league: str):
+        if self.local:
+            return pd.DataFrame(data=json.load(open(f"{league}_props.json", "r")))
+        return get_dynamo_table_dataframe(f"{league}_props")
+    def get_outcomes(self, league: str):
+        if self.local:
+            return pd.DataFrame(data=json.load(open(f"{league}_outcomes.json", "r")))
+        return get_dynamo_table_dataframe(f"{league}_outcomes")
+    def get_joined(self, league: str):
+        """
+        Closing line (last downloaded) of every prop joined to its outcome (at that line when outcomes
+        record line_value), one row per (game, player, stat) sorted by (player, game date).
+        Empty when either table is
+        """
+        props_df: pd.DataFrame = self.get_props(league)
+        outcomes_df: pd.DataFrame = self.get_outcomes(league)
+        if props_df.empty or outcomes_df.empty:
+            return pd.DataFrame()
+        keys = JOIN_KEYS + (['line_value'] if 'line_value' in outcomes_df.columns else [])
+        for df in [props_df, outcomes_df]:
+            for col in JOIN_KEYS:
+                df[col] = df[col].astype(str)
+            if 'line_value' in keys:
+                df['line_value'] = df['line_value'].astype(float)
+        props_df['bovada_datetime_obj'] = pd.to_datetime(props_df['bovada_date'], format=DATETIME_FORMAT)
+        props_df['datetime_downloaded_obj'] = pd.to_datetime(props_df['date_downloaded'], format=DATETIME_FORMAT)
+        if self.start_date is not None:
+            props_df = props_df[props_df['bovada_datetime_obj']>=self.start_date]
+        if self.end_date is not None:
+            props_df = props_df[props_df['bovada_datetime_obj']<=self.end_date]
+        # closing line: one row per game/player/stat, whatever lines it had before
+        props_df = props_df.sort_values(by=['datetime_downloaded_obj'], ascending=True)
+        props_df = props_df.drop_duplicates(subset=JOIN_KEYS, keep='last')
+        outcomes_df = outcomes_df[keys+['outcome']].drop_duplicates(subset=keys, keep='last')
+        df = props_df[keys+['bovada_datetime_obj', 'over_odds', 'under_odds']].merge(outcomes_df, on=keys, how='inner')
+        df['outcome'] = df['outcome'].astype(str).str.lower()
+        return df.sort_values(by=['stat', 'player_id', 'bovada_datetime_obj'], ascending=True)
+    def get_partitions(self):
+        """
+        (league, stat, arrays) per league + stat type, only numpy arrays cross the process boundary
+        """
+        partitions = []
+        for league in self.leagues:
+            df = self.get_joined(league)
+            if df.empty:
+                continue
+            for stat, stat_df in df.groupby(by=['stat'], sort=False):
+                stat = stat[0] if type(stat) is tuple else stat
+                partitions.append((league, stat, {
+                    'player_code': pd.factorize(stat_df['player_id'])[0],
+                    'outcome': stat_df['outcome'].to_numpy(dtype=str),
+                    'over_odds': pd.to_numeric(stat_df['over_odds'], errors='coerce').to_numpy(dtype=float),
+                    'under_odds': pd.to_numeric(stat_df['under_odds'], errors='coerce').to_numpy(dtype=float)
+                }))
+        return partitions
+    def run(self, rules: list[tuple] = None, max_workers: int = None):
+        rules = rules or make_rules()
+        partitions = self.get_partitions()
+        res = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(evaluate_partition, league, stat, arrays, rules) for league, stat, arrays in partitions]
+            for future in futures:
+                res += future.result()
+        df = pd.DataFrame(res)
+        if not df.empty:
+            df = df.sort_values(by=['roi'], ascending=False)
+        return df
+    def summarize(self, results_df: pd.DataFrame):
+        """
+        Rule performance across every stat type per league
+        """
+        columns = ['league', 'side', 'window', 'threshold', 'bets', 'wins', 'losses', 'pushes', 'units', 'hit_rate', 'roi']
+        if results_df.empty:
+            return pd.DataFrame(columns=columns)
+        df = results_df.groupby(by=['league', 'side', 'window', 'threshold'])[['bets', 'wins', 'losses', 'pushes', 'units']].sum().reset_index()
+        df['hit_rate'] = round(df['wins'] / df['bets'].replace(0, np.nan) * 100.0, 2)
+        df['roi'] = round(df['units'] / df['bets'].replace(0, np.nan) * 100.0, 2)
+        return df.sort_values(by=['roi'], ascending=False)
+# END Backtest
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="Backtest last-N hit rate rules over props joined to outcomes")
+    parser.add_argument('--leagues', nargs='+', default=['nba', 'mlb'])
+    parser.add_argument('--dynamo', action='store_true', help="read tables from DynamoDB instead of <league>_props.json/<league>_outcomes.json")
+    parser.add_argument('--start_date', default=None)
+    parser.add_argument('--end_date', default=None)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    start = time.time()
+    bt = Backtest(args.leagues, local=not args.dynamo, start_date=args.start_date, end_date=args.end_date)
+    results_df = bt.run(max_workers=args.workers)
+    results_df.to_csv("backtest_results.csv", index=False)
+    bt.summarize(results_df).to_csv("backtest_summary.csv", index=False)
+    print(f"Time elapsed: {time.time() - start}")
\ No newline at end of file
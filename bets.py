@@ -6,11 +6,15 @@ from datetime import datetime
 import time
 import logging
 
-from PlayerDataObj import PlayerDataObj
+from PlayerDataObj import PlayerDataObj, get_players_entries, get_gamelogs_version
+from gamelog_index import GamelogIndex, GAMELOG_INDEX_CACHE
 from logging_config import setup_logging
-from const import BOVADA_PROP_STAT_MAPPINGS, DATETIME_FORMAT
+from const import BOVADA_PROP_STAT_MAPPINGS, DATETIME_FORMAT, REQUEST_BUDGET_SECONDS
+from fetch_policy import Deadline
 from aws import get_dynamo_table_dataframe
 
+from nba_api.stats.static.teams import get_teams
+
 INITIAL_VALUES = [{
     "id": 1,
     "bet": {
@@ -34,10 +38,11 @@ INITIAL_VALUES = [{
 }]
 
 class BetResponseObj:
-    def __init__(self, bet_slip_object: dict, player_data: PlayerDataObj, props_df: pd.DataFrame):
+    def __init__(self, bet_slip_object: dict, player_data: PlayerDataObj, props_df: pd.DataFrame, gamelog_index: GamelogIndex):
         self.bet_slip_object = bet_slip_object
         self.player_data = player_data
         self.props_df = props_df
+        self.gamelog_index = gamelog_index
         # bet attributes
         self.bet_type: str = self.bet_slip_object['user_option']
         self.number_value: float = self.bet_slip_object['bet']['line_value']
@@ -66,19 +71,41 @@ class BetResponseObj:
         return
     def get_hits_last_n(self, n: int):
         try:
-            df = self.all_gamelogs.copy()
-            df = df.sort_values(by=['GAME_DATE'], ascending=False)
-            df = df.head(n)
-            if self.bet_type == 'over':
-                return len(df[(df[self.bovada_stat]>self.number_value)])
-            elif self.bet_type == 'under':
-                return len(df[(df[self.bovada_stat]<self.number_value)])
-            elif self.bet_type == 'at least':
-                return len(df[(df[self.bovada_stat]>=self.number_value)])
-            return None
+            return self.gamelog_index.get().hits(self.raw_stat, self.number_value, self.bet_type, n)
         except Exception as e:
             logging.error(f"Error getting get_hits_last_n({n}): {e}")
             return None
+    def get_opponent(self):
+        """
+        Opponent abbreviation from the bovada game id, e.g. indiana-pacers-new-york-knicks-202505232000 -> NYK
+        """
+        team_abbr = self.bet_slip_object['bet'].get('team_abbr')
+        for team in get_teams():
+            slug = team['full_name'].lower().replace(' ', '-')
+            if slug in self.game_id and team['abbreviation'] != team_abbr:
+                return team['abbreviation']
+        return None
+    def get_hit_splits(self):
+        """
+        Hits + averages for home/away, season type and the upcoming opponent, all games and last 10
+        """
+        try:
+            splits = ['home', 'away', 'regular', 'post']
+            opponent = self.get_opponent()
+            if opponent:
+                splits.append(f"vs_{opponent}")
+            data = {}
+            for split in splits:
+                key = 'vs_opponent' if split.startswith('vs_') else split
+                data[key] = {
+                    'all': self.gamelog_index.get_split_summary(split, self.raw_stat, self.number_value, self.bet_type),
+                    'last_10': self.gamelog_index.get_split_summary(split, self.raw_stat, self.number_value, self.bet_type, 10)
+                }
+            data['opponent'] = opponent
+            return data
+        except Exception as e:
+            logging.error(f"Error getting hit_splits: {e}")
+            return None
     def get_season_avg(self):
         try:
             df: pd.DataFrame = self.career_stats['season_totals_regular_season']
@@ -195,6 +222,7 @@ class BetResponseObj:
             'hit_last_5_games': self.get_hits_last_n(5),
             'hit_last_10_games': self.get_hits_last_n(10),
             'hit_last_20_games': self.get_hits_last_n(20),
+            'hit_splits': self.get_hit_splits(),
             'avg_and_rank_table_data': self.get_avg_and_rank_table_data(),
             'last_10_stats': json.loads(df.to_json(orient='records')),
             'same_game_props': self.get_same_game_props()
@@ -207,15 +235,46 @@ class Bets:
         self.data = data
         self.data = [item for item in self.data if 'bet' in item]
         self.player_ids = list(set([d['bet']['player_id'] for d in self.data if 'id' in d]))
-        self.player_data = { pid: PlayerDataObj(pid) for pid in self.player_ids }
+        # every player's fetches start together under one latency budget,
+        # players that can't be served are reported in get_data as skipped
+        players_entries, errors = get_players_entries(self.player_ids, Deadline(REQUEST_BUDGET_SECONDS))
+        self.player_data, self.gamelog_indexes, self.skipped_players = {}, {}, {}
+        for pid in self.player_ids:
+            if pid in errors:
+                logging.error(f"Error getting player data for {pid} : {errors[pid]}")
+                self.skipped_players[pid] = 'upstream_unavailable'
+                continue
+            entries = players_entries[pid]
+            player_data = PlayerDataObj(pid, entries=entries)
+            if player_data.all_gamelogs is None:
+                self.skipped_players[pid] = 'no_gamelogs'
+                continue
+            self.player_data[pid] = player_data
+            # shared by all of their bets and across requests until a gamelog is refetched
+            self.gamelog_indexes[pid] = GAMELOG_INDEX_CACHE.get(pid, get_gamelogs_version(entries), player_data.all_gamelogs)
+        self.player_ids = list(self.player_data.keys())
         self.props_df: pd.DataFrame = self.get_props()
         self.props_df['date_collected_obj'] = self.props_df['date_collected'].apply(lambda x: datetime.strptime(x, DATETIME_FORMAT))
         return
     def get_props(self):
         # return get_dynamo_table_dataframe('nba_props')
         return pd.DataFrame(data=json.load(open("nba_props.json", "r")))
+    def get_skipped_response(self, bet: dict, reason: str):
+        """
+        Marker for a bet whose player data couldn't be loaded, retry is True when trying again later can help
+        """
+        return {
+            'primary_key': bet['bet']['primary_key'],
+            'player_id': bet['bet']['player_id'],
+            'skipped': True,
+            'reason': reason,
+            'retry': reason == 'upstream_unavailable'
+        }
     def get_data(self):
         responses = []
+        for pid, reason in self.skipped_players.items():
+            bets = [item for item in self.data if item['bet']['player_id']==pid]
+            responses += [self.get_skipped_response(bet, reason) for bet in bets]
         for pid in self.player_ids:
             player_data = self.player_data[pid]
             bets = [item for item in self.data if item['bet']['player_id']==pid]
@@ -225,7 +284,8 @@ class Bets:
                         BetResponseObj(
                             bet, 
                             player_data,
-                            self.props_df[self.props_df['player_id']==pid]
+                            self.props_df[self.props_df['player_id']==pid],
+                            self.gamelog_indexes[pid]
                         ).get_player_bet_data()
                     )
                 except Exception as e:
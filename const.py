@@ -16,4 +16,37 @@ BOVADA_PROP_STAT_MAPPINGS = {
     'total_rebounds_and_assists': ['REB', 'AST'],
     'total_steals': ['STL'],
     'total_turnovers': ['TOV']
-}
\ No newline at end of file
+}
+
+# gamelog season types -> nba_api season_type_all_star values
+SEASON_TYPES = {
+    'regular': 'Regular Season',
+    'post': 'Playoffs'
+}
+
+# seconds before a current season gamelog is refetched, past seasons never change
+CURRENT_SEASON_GAMELOG_TTL = 60 * 60
+
+# upstream (nba_api) fetch policy
+REQUEST_BUDGET_SECONDS = 5 # max time a request waits on uncached upstream data
+UPSTREAM_TIMEOUT_SECONDS = 15 # http timeout of a single nba_api call, background refreshes included
+CIRCUIT_FAILURE_THRESHOLD = 5 # consecutive failures before nba_api traffic is stopped
+CIRCUIT_RESET_SECONDS = 30 # seconds before a trial request is let through again
+FETCH_POLICY_MAX_ENTRIES = 5000 # cached nba_api results, least recently used are dropped
+NBA_API_MAX_WORKERS = 8 # parallel nba_api fetches
+NBA_API_MIN_INTERVAL = 0.15 # seconds between nba_api request starts across all workers
+PLAYER_INFO_TTL = 24 * 60 * 60
+CAREER_STATS_TTL = 60 * 60
+
+# /get_gamelogs_bulk limits, every key is an nba_api call when it isn't cached
+FIRST_SEASON = 1946
+MAX_BULK_PLAYER_IDS = 15
+BULK_REQUEST_BUDGET_SECONDS = 10
+# as many gamelogs as the rate limiter can start within the bulk budget, leaving 1s for the last responses
+MAX_BULK_GAMELOG_KEYS = int((BULK_REQUEST_BUDGET_SECONDS - 1) / NBA_API_MIN_INTERVAL)
+
+# /stream_props server sent events
+LEAGUES = ['nba', 'mlb'] # leagues with a <league>_props table
+PROPS_POLL_SECONDS = 15 # one DynamoDB poll per league, shared by every subscriber
+SSE_HEARTBEAT_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 100 # pending updates before a slow subscriber is resynced with a snapshot
\ No newline at end of file
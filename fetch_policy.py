@@ -0,0 +1,184 @@
+import threading
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from const import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, FETCH_POLICY_MAX_ENTRIES, NBA_API_MAX_WORKERS, NBA_API_MIN_INTERVAL
+
+class UpstreamUnavailable(Exception):
+    """
+    Nothing cached for a key and upstream is failing, the circuit is open or the budget ran out
+    """
+    pass
+
+class Deadline:
+    """
+    Per request latency budget, shared by every upstream fetch the request makes
+    """
+    def __init__(self, budget: float):
+        self.expires_at = time.monotonic() + budget
+        return
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+# END Deadline
+
+class RateLimiter:
+    """
+    Spaces request starts min_interval apart across every worker thread
+    """
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+        return
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+        return
+# END RateLimiter
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures, after reset_seconds one trial request
+    is let through (half open), success closes it again and failure re-opens it
+    """
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+        return
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_in_flight or (time.monotonic() - self.opened_at) < self.reset_seconds:
+                return False
+            self.trial_in_flight = True
+            return True
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+        return
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.trial_in_flight:
+                    logging.warning(f"Circuit open after {self.failures} consecutive upstream failures")
+                self.opened_at = time.monotonic()
+                self.trial_in_flight = False
+        return
+# END CircuitBreaker
+
+class FetchPolicy:
+    """
+    Stale-while-revalidate cache in front of an upstream:
+    - fresh entries are returned as is
+    - stale entries are returned immediately and refreshed in the background
+    - missing entries are fetched, waiting at most the request's Deadline
+    Fetches that outlive a deadline keep running and fill the cache for the next request.
+    Entries are (value, fetched_at, seq), seq is unique per fetch, treat values as read only.
+    At most max_entries are kept, least recently used first out
+    """
+    def __init__(self, breaker: CircuitBreaker, max_workers: int = 4, name: str = "upstream", max_entries: int = FETCH_POLICY_MAX_ENTRIES):
+        self.breaker = breaker
+        self.name = name
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.in_flight: dict = {}
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        return
+    def is_fresh(self, entry: tuple, ttl: float):
+        return ttl is None or (time.time() - entry[1]) < ttl
+    def refresh(self, key, fetcher):
+        """
+        Starts (or joins) a fetch for key, None when the circuit is open
+        """
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future is not None:
+                return future
+            if not self.breaker.allow():
+                return None
+            future = self.executor.submit(self.run_fetch, key, fetcher)
+            self.in_flight[key] = future
+        return future
+    def run_fetch(self, key, fetcher):
+        try:
+            value = fetcher()
+        except Exception as e:
+            self.breaker.record_failure()
+            logging.error(f"{self.name} fetch failed for {key}: {e}")
+            with self.lock:
+                self.in_flight.pop(key, None)
+            raise
+        self.breaker.record_success()
+        with self.lock:
+            self.seq += 1
+            entry = (value, time.time(), self.seq)
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.in_flight.pop(key, None)
+        return entry
+    def get_many_partial(self, keys: list, fetcher, ttl, deadline: Deadline = None):
+        """
+        ({ key: entry }, { key: error message }), every missing key is fetched in parallel before waiting.
+        fetcher(key) -> value, ttl: seconds (None never goes stale) or ttl(key) -> seconds
+        A key is in errors when it has nothing cached and can't be fetched within the deadline
+        """
+        res, waiting, errors = {}, {}, {}
+        for key in keys:
+            if key in res or key in waiting or key in errors:
+                continue
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries.move_to_end(key)
+            key_ttl = ttl(key) if callable(ttl) else ttl
+            if entry is not None:
+                res[key] = entry
+                if not self.is_fresh(entry, key_ttl):
+                    self.refresh(key, lambda key=key: fetcher(key))
+                continue
+            future = self.refresh(key, lambda key=key: fetcher(key))
+            if future is None:
+                errors[key] = f"{self.name} circuit open, nothing cached for {key}"
+                continue
+            waiting[key] = future
+        for key, future in waiting.items():
+            try:
+                res[key] = future.result(timeout=deadline.remaining() if deadline else None)
+            except FutureTimeoutError:
+                errors[key] = f"{self.name} fetch for {key} ran past the request budget"
+            except Exception as e:
+                errors[key] = f"{self.name} fetch for {key} failed: {e}"
+        return res, errors
+    def get_many(self, keys: list, fetcher, ttl, deadline: Deadline = None):
+        """
+        { key: entry } for every key, raises UpstreamUnavailable if any key can't be served (see get_many_partial)
+        """
+        res, errors = self.get_many_partial(keys, fetcher, ttl, deadline)
+        if errors:
+            raise UpstreamUnavailable(next(iter(errors.values())))
+        return res
+    def get(self, key, fetcher, ttl, deadline: Deadline = None):
+        return self.get_many([key], fetcher, ttl, deadline)[key]
+# END FetchPolicy
+
+NBA_API_POLICY = FetchPolicy(CircuitBreaker(), max_workers=NBA_API_MAX_WORKERS, name="nba_api")
+# shared by every nba_api fetcher, replaces sleeping 0.6s in each worker after every call
+NBA_API_RATE_LIMITER = RateLimiter(NBA_API_MIN_INTERVAL)
\ No newline at end of file
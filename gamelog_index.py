@@ -0,0 +1,138 @@
+import pandas as pd
+import numpy as np
+import math
+import threading
+from collections import OrderedDict
+
+from const import BOVADA_PROP_STAT_MAPPINGS
+
+class StatWindowIndex:
+    """
+    Prefix sums + cumulative value counts for one subset of games, most recent game first,
+    so "last n" is always the first n rows and every query is a couple of array lookups.
+    Built per stat the first time the stat is queried
+    """
+    def __init__(self, values: dict[str, np.ndarray]):
+        self.values = values
+        self.n: int = len(next(iter(values.values()))) if values else 0
+        self.prefix: dict[str, np.ndarray] = {}
+        self.counts_ge: dict[str, np.ndarray] = {}
+        return
+    def build(self, stat: str):
+        vals = self.values[stat]
+        # counts_ge[k, v] = games among the first k with value >= v, v in 0..max+1
+        thresholds = np.arange(int(vals.max()) + 2 if len(vals) else 1)
+        self.counts_ge[stat] = np.vstack([
+            np.zeros(len(thresholds), dtype=np.int32),
+            np.cumsum(vals[:, None] >= thresholds[None, :], axis=0, dtype=np.int32)
+        ])
+        self.prefix[stat] = np.r_[0, np.cumsum(vals)]
+        return
+    def games(self, n: int = None):
+        return self.n if n is None else max(0, min(n, self.n))
+    def count_ge(self, stat: str, k: int, value: int):
+        if stat not in self.prefix:
+            self.build(stat)
+        counts = self.counts_ge[stat]
+        if value <= 0:
+            return k
+        if value >= counts.shape[1]:
+            return 0
+        return int(counts[k, value])
+    def hits(self, stat: str, line: float, bet_type: str, n: int = None):
+        """
+        Number of the last n games (all when None) that hit line for bet_type, stats are whole numbers
+        """
+        k = self.games(n)
+        if bet_type == 'over':
+            return self.count_ge(stat, k, math.floor(line) + 1)
+        elif bet_type == 'under':
+            return k - self.count_ge(stat, k, math.ceil(line))
+        elif bet_type == 'at least':
+            return self.count_ge(stat, k, math.ceil(line))
+        return None
+    def avg(self, stat: str, n: int = None):
+        k = self.games(n)
+        if k == 0:
+            return None
+        if stat not in self.prefix:
+            self.build(stat)
+        return round(float(self.prefix[stat][k]) / k, 2)
+# END StatWindowIndex
+
+class GamelogIndex:
+    """
+    Per player StatWindowIndexes over every BOVADA_PROP_STAT_MAPPINGS stat,
+    for all games and the home/away, season type (regular/post) and opponent (vs_<abbr>) splits.
+    Splits are built the first time they are requested
+    """
+    def __init__(self, all_gamelogs: pd.DataFrame):
+        df = all_gamelogs.sort_values(by=['GAME_DATE'], ascending=False, kind='mergesort')
+        cols = sorted(set(col for stats in BOVADA_PROP_STAT_MAPPINGS.values() for col in stats))
+        raw = df[cols].fillna(0).to_numpy(dtype=np.int64)
+        self.combos: dict[str, np.ndarray] = {
+            stat: raw[:, [cols.index(col) for col in stats]].sum(axis=1) for stat, stats in BOVADA_PROP_STAT_MAPPINGS.items()
+        }
+        is_home = (df['is_home'] if 'is_home' in df.columns else ~df['MATCHUP'].str.contains('@')).to_numpy(dtype=bool)
+        self.opponents: np.ndarray = df['MATCHUP'].astype(str).str.split(' ').str[-1].to_numpy()
+        self.masks: dict[str, np.ndarray] = {
+            'all': np.ones(len(df.index), dtype=bool),
+            'home': is_home,
+            'away': ~is_home,
+            'regular': (df['SEASON_TYPE']=='regular').to_numpy(dtype=bool),
+            'post': (df['SEASON_TYPE']=='post').to_numpy(dtype=bool)
+        }
+        self.splits: dict[str, StatWindowIndex] = {}
+        return
+    def get(self, split: str = 'all'):
+        index = self.splits.get(split)
+        if index is not None:
+            return index
+        if split in self.masks:
+            mask = self.masks[split]
+        elif split.startswith('vs_'):
+            mask = self.opponents == split[3:]
+        else:
+            return None
+        index = StatWindowIndex({ stat: vals[mask] for stat, vals in self.combos.items() })
+        self.splits[split] = index
+        return index
+    def get_split_summary(self, split: str, stat: str, line: float, bet_type: str, n: int = None):
+        """
+        { games, hits, avg } for the last n games of split, None if the player has no games in it
+        """
+        index = self.get(split)
+        if index is None or index.n == 0:
+            return None
+        return {
+            'games': index.games(n),
+            'hits': index.hits(stat, line, bet_type, n),
+            'avg': index.avg(stat, n)
+        }
+# END GamelogIndex
+
+class GamelogIndexCache:
+    """
+    LRU of GamelogIndexes keyed on (player_id, fetch seqs of the gamelogs it was built from)
+    """
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        return
+    def get(self, player_id, version: tuple, all_gamelogs: pd.DataFrame):
+        key = (int(player_id), version)
+        with self.lock:
+            index = self.entries.get(key)
+            if index is not None:
+                self.entries.move_to_end(key)
+                return index
+        index = GamelogIndex(all_gamelogs)
+        with self.lock:
+            self.entries[key] = index
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return index
+# END GamelogIndexCache
+
+GAMELOG_INDEX_CACHE = GamelogIndexCache()
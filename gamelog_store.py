@@ -0,0 +1,112 @@
+import pandas as pd
+import json
+from datetime import datetime
+
+from const import SEASON_TYPES, CURRENT_SEASON_GAMELOG_TTL, UPSTREAM_TIMEOUT_SECONDS
+from fetch_policy import FetchPolicy, Deadline, NBA_API_POLICY, NBA_API_RATE_LIMITER
+
+def get_current_season():
+    """
+    when month is greater than July use current year else current year is -1
+    """
+    now = datetime.now()
+    curr_month, curr_season = now.month, now.year
+    if curr_month < 7: # before august
+        curr_season -= 1
+    return curr_season
+
+def frame_to_columnar_json(df: pd.DataFrame, missing: list[tuple] = None):
+    """
+    { "count": n, "columns": [...], "data": { column: [values] }, "missing": [...] }, column names are written once.
+    missing lists the gamelog keys that couldn't be fetched in time, as { player_id, season, season_type }
+    """
+    data = ",".join(f'"{col}":{df[col].to_json(orient="values")}' for col in df.columns)
+    columns = ",".join(f'"{col}"' for col in df.columns)
+    missing = json.dumps([{ 'player_id': key[1], 'season': key[2], 'season_type': key[3] } for key in missing or []])
+    return f'{{"count":{len(df.index)},"columns":[{columns}],"data":{{{data}}},"missing":{missing}}}'
+
+def frame_to_result_dict(df: pd.DataFrame, key: tuple):
+    """
+    Store frame back in the PlayerGameLog(...).get_dict() shape
+    """
+    _, player_id, season, season_type = key
+    df = df.drop(columns=['SEASON', 'SEASON_TYPE'])
+    return {
+        "resource": "playergamelog",
+        "parameters": {
+            "PlayerID": player_id,
+            "LeagueID": None,
+            "Season": str(season),
+            "SeasonType": SEASON_TYPES[season_type],
+            "DateFrom": None,
+            "DateTo": None
+        },
+        "resultSets": [{
+            "name": "PlayerGameLog",
+            "headers": list(df.columns),
+            "rowSet": json.loads(df.to_json(orient='values'))
+        }]
+    }
+
+class GamelogStore:
+    """
+    Shared (player_id, season, season_type) -> PlayerGameLog frame store on top of the nba_api FetchPolicy,
+    anything missing is fetched in parallel, expired current season frames are refreshed in the background
+    """
+    def __init__(self, policy: FetchPolicy):
+        self.policy = policy
+        return
+    def make_key(self, player_id, season, season_type: str):
+        if season_type not in SEASON_TYPES:
+            raise ValueError(f"Unknown season_type: {season_type}")
+        return ('gamelog', int(player_id), int(season), season_type)
+    def get_ttl(self, key: tuple):
+        if key[2] < get_current_season():
+            return None # past seasons never change
+        return CURRENT_SEASON_GAMELOG_TTL
+    def fetch(self, key: tuple):
+        from nba_api.stats.endpoints.playergamelog import PlayerGameLog
+        _, player_id, season, season_type = key
+        NBA_API_RATE_LIMITER.wait()
+        df: pd.DataFrame = PlayerGameLog(player_id, str(season), SEASON_TYPES[season_type], timeout=UPSTREAM_TIMEOUT_SECONDS).get_data_frames()[0]
+        df.insert(0, 'SEASON', season)
+        df.insert(1, 'SEASON_TYPE', season_type)
+        return df
+    def get_entries(self, keys: list[tuple], deadline: Deadline = None):
+        """
+        Returns { key: (DataFrame, fetched_at, seq) } for every key, treat the frames as read only.
+        seq is unique per fetch so callers can key derived payloads on it
+        """
+        return self.policy.get_many(keys, self.fetch, self.get_ttl, deadline)
+    def get_entries_partial(self, keys: list[tuple], deadline: Deadline = None):
+        """
+        ({ key: entry }, { key: error message }), see FetchPolicy.get_many_partial
+        """
+        return self.policy.get_many_partial(keys, self.fetch, self.get_ttl, deadline)
+    def get_many(self, keys: list[tuple], deadline: Deadline = None):
+        return { key: entry[0] for key, entry in self.get_entries(keys, deadline).items() }
+    def get_player_keys(self, player_id, seasons: list[int]):
+        """
+        Regular season then post season keys, the order gamelogs are concatenated in
+        """
+        return [self.make_key(player_id, s, t) for t in SEASON_TYPES for s in seasons]
+    def concat_player_gamelogs(self, player_id, keys: list[tuple], frames: dict):
+        """
+        Gamelogs of keys as one (new) frame, None when the player has none
+        """
+        df_list = [frames[key] for key in keys if not frames[key].empty]
+        if not df_list:
+            print(f"No gamelogs found for {player_id}")
+            return None
+        df = pd.concat(df_list)
+        df['is_home'] = ~df['MATCHUP'].str.contains('@')
+        return df
+    def get_player_gamelogs(self, player_id, seasons: list[int], deadline: Deadline = None):
+        """
+        All regular season then post season gamelogs for seasons, None when the player has none
+        """
+        keys = self.get_player_keys(player_id, seasons)
+        return self.concat_player_gamelogs(player_id, keys, self.get_many(keys, deadline))
+# END GamelogStore
+
+GAMELOG_STORE = GamelogStore(NBA_API_POLICY)
\ No newline at end of file
@@ -1,24 +1,17 @@
-from flask import Flask, jsonify, request, session
+from flask import Flask, jsonify, request
 from datetime import datetime
 from dotenv import load_dotenv
 import os
-from flask_cors import CORS, cross_origin
+from flask_cors import CORS
 import logging
 import json
-import simplejson
-import boto3
-from boto3.dynamodb.types import TypeDeserializer
-import pandas as pd
 import secrets
 
 from const import DATETIME_FORMAT
 from logging_config import setup_logging
-from aws import get_dynamo_table_dataframe, get_props_by_date
-from PlayerDataObj import PlayerDataObj
-from bets import Bets
 
+# static player list only, the nba_api endpoint modules are imported inside the routes that need them
 from nba_api.stats.static.players import find_players_by_first_name, find_players_by_last_name, find_players_by_full_name, get_players
-from nba_api.stats.endpoints import playercareerstats, playergamelog
 
 load_dotenv()
 
@@ -45,49 +38,164 @@ def get_gamelogs(player_id: int):
     Both regular season and playoffs
     when month is greater than July use current year else current year is -1
     """
-    now = datetime.now()
-    curr_month, curr_season = now.month, now.year
-    if curr_month < 7: # before august
-        curr_season -= 1
-    data = {
-        "current_season_reg": playergamelog.PlayerGameLog(player_id, str(curr_season), r"Regular Season").get_dict(),
-        "current_season_po": playergamelog.PlayerGameLog(player_id, str(curr_season), r"Playoffs").get_dict(),
-        "last_season_reg": playergamelog.PlayerGameLog(player_id, str(curr_season-1), r"Regular Season").get_dict(),
-        "last_season_po": playergamelog.PlayerGameLog(player_id, str(curr_season-1), r"Playoffs").get_dict()
-    }
+    from gamelog_store import GAMELOG_STORE, get_current_season, frame_to_result_dict
+    from fetch_policy import Deadline, UpstreamUnavailable
+    from const import REQUEST_BUDGET_SECONDS
+    curr_season = get_current_season()
+    try:
+        keys = {
+            "current_season_reg": GAMELOG_STORE.make_key(player_id, curr_season, 'regular'),
+            "current_season_po": GAMELOG_STORE.make_key(player_id, curr_season, 'post'),
+            "last_season_reg": GAMELOG_STORE.make_key(player_id, curr_season-1, 'regular'),
+            "last_season_po": GAMELOG_STORE.make_key(player_id, curr_season-1, 'post')
+        }
+    except ValueError:
+        return jsonify({
+            "message": f"Invalid player id {player_id}"
+        }), 400
+    try:
+        frames = GAMELOG_STORE.get_many(list(keys.values()), Deadline(REQUEST_BUDGET_SECONDS))
+    except UpstreamUnavailable as e:
+        logging.error(f"Error getting gamelogs for {player_id}: {e}")
+        return jsonify({
+            "message": f"Gamelogs for {player_id} are temporarily unavailable"
+        }), 503
+    data = { name: frame_to_result_dict(frames[key], key) for name, key in keys.items() }
     return jsonify(data)
 
+@app.route(f'/get_gamelogs_bulk', methods=['GET'])
+def get_gamelogs_bulk():
+    """
+    Gamelogs for many players in one round trip, columnar
+    ?player_ids=1630169,1629029&seasons=2023,2024&season_types=regular,post
+    seasons default to current + last season, season_types to both
+    Gamelogs that can't be fetched within the budget are listed in "missing" for the client to retry
+    """
+    from gamelog_store import GAMELOG_STORE, get_current_season, frame_to_columnar_json
+    from payload_cache import GAMELOG_PAYLOAD_CACHE, CachedPayload
+    from fetch_policy import Deadline
+    from const import SEASON_TYPES, BULK_REQUEST_BUDGET_SECONDS, FIRST_SEASON, MAX_BULK_PLAYER_IDS, MAX_BULK_GAMELOG_KEYS
+    try:
+        player_ids = sorted(set(int(pid) for pid in request.args.get('player_ids', '').split(',') if pid))
+        curr_season = get_current_season()
+        seasons = sorted(set(int(s) for s in request.args.get('seasons', f"{curr_season-1},{curr_season}").split(',') if s))
+        season_types = [t for t in SEASON_TYPES if t in request.args.get('season_types', ','.join(SEASON_TYPES)).split(',')]
+    except ValueError:
+        return jsonify({
+            "message": "player_ids and seasons must be comma separated integers"
+        }), 400
+    if not player_ids or not seasons or not season_types:
+        return jsonify({
+            "message": "player_ids, seasons and season_types are required"
+        }), 400
+    if seasons[0] < FIRST_SEASON or seasons[-1] > curr_season:
+        return jsonify({
+            "message": f"seasons must be between {FIRST_SEASON} and {curr_season}"
+        }), 400
+    if len(player_ids) > MAX_BULK_PLAYER_IDS:
+        return jsonify({
+            "message": f"At most {MAX_BULK_PLAYER_IDS} player_ids per request"
+        }), 400
+    if len(player_ids) * len(seasons) * len(season_types) > MAX_BULK_GAMELOG_KEYS:
+        return jsonify({
+            "message": f"At most {MAX_BULK_GAMELOG_KEYS} gamelogs (player_ids x seasons x season_types) per request"
+        }), 400
+    keys = [GAMELOG_STORE.make_key(pid, s, t) for pid in player_ids for t in season_types for s in seasons]
+    entries, errors = GAMELOG_STORE.get_entries_partial(keys, Deadline(BULK_REQUEST_BUDGET_SECONDS))
+    if errors:
+        # whatever arrived in time + the missing keys for the client to retry, never cached
+        logging.error(f"Bulk gamelogs missing {len(errors)} of {len(keys)}: {next(iter(errors.values()))}")
+        import pandas as pd
+        df_list = [entries[key][0] for key in keys if key in entries and not entries[key][0].empty]
+        df = pd.concat(df_list) if df_list else pd.DataFrame()
+        return CachedPayload(frame_to_columnar_json(df, [key for key in keys if key in errors]).encode('utf-8')).make_response(request)
+    # keyed on the fetch seq of every frame, any refresh builds a new payload
+    cache_key = tuple(entries[key][2] for key in keys)
+    payload = GAMELOG_PAYLOAD_CACHE.get(cache_key)
+    if payload is None:
+        import pandas as pd
+        df_list = [entries[key][0] for key in keys if not entries[key][0].empty]
+        df = pd.concat(df_list) if df_list else pd.DataFrame()
+        payload = GAMELOG_PAYLOAD_CACHE.put(cache_key, frame_to_columnar_json(df))
+    return payload.make_response(request)
+
 @app.route(f'/get_all_players', methods=['GET'])
 def get_all_players():
     return get_players()
 
 @app.route(f'/get_player_data_obj/<player_id>', methods=['GET'])
 def get_player_data_obj(player_id: int):
-    data = PlayerDataObj(player_id).as_dict()
-    if not data:
+    """
+    Serialized + compressed once per version of the player's nba_api data, repeat views are a lookup (or a 304)
+    """
+    from payload_cache import PLAYER_PAYLOAD_CACHE
+    from PlayerDataObj import PlayerDataObj, get_player_entries, get_entries_version
+    from fetch_policy import Deadline, UpstreamUnavailable
+    from const import REQUEST_BUDGET_SECONDS
+    try:
+        entries = get_player_entries(player_id, Deadline(REQUEST_BUDGET_SECONDS))
+    except ValueError:
         return jsonify({
-            "message": f"Error getting player data for {player_id}"
+            "message": f"Invalid player id {player_id}"
         }), 400
-    return jsonify(data), 200
+    except UpstreamUnavailable as e:
+        logging.error(f"Error getting player data for {player_id}: {e}")
+        return jsonify({
+            "message": f"Player data for {player_id} is temporarily unavailable"
+        }), 503
+    # keyed on the fetch seqs, a (background) refresh of any frame builds a new payload
+    cache_key = (int(player_id), get_entries_version(entries))
+    payload = PLAYER_PAYLOAD_CACHE.get(cache_key)
+    if payload is None:
+        player_data = PlayerDataObj(player_id, entries=entries)
+        if player_data.all_gamelogs is None:
+            return jsonify({
+                "message": f"Error getting player data for {player_id}"
+            }), 400
+        payload = PLAYER_PAYLOAD_CACHE.put(cache_key, player_data.as_json())
+    return payload.make_response(request)
 
 @app.route(f'/post_bet_info', methods=['GET', 'POST'])
 def post_bet_info():
+    from bets import Bets
     data = request.get_json()
     return Bets(data).get_data()
 
 @app.route(f'/get_table/<table_name>', methods=['GET'])
 def get_tables(table_name: str):
+    from aws import get_dynamo_table_dataframe
     return json.loads(get_dynamo_table_dataframe(table_name).to_json(orient='records'))
 
 @app.route(f'/get_upcoming_props/<league>', methods=['GET'])
 def get_upcoming_props(league: str):
+    from aws import get_props_by_date
     today = datetime.now().date()
-    df: pd.DataFrame = get_props_by_date(league, today)
+    df = get_props_by_date(league, today)
     df['datetime_downloaded_obj'] = df['date_downloaded'].apply(lambda x: datetime.strptime(x, DATETIME_FORMAT))
     df = df.sort_values(by=['datetime_downloaded_obj'], ascending=True)
     df = df.drop_duplicates(subset=['player_id', 'stat', 'id'], keep='last')
     return json.loads(df.to_json(orient='records'))
 
+@app.route(f'/stream_props/<league>', methods=['GET'])
+def stream_props(league: str):
+    """
+    Server sent events instead of polling /get_upcoming_props, optional ?game_id=&player_id= filters
+    event: snapshot - current lines, once (again if the client falls behind)
+    event: update - only lines whose line_value/odds changed
+    """
+    from flask import Response, stream_with_context
+    from props_stream import get_feed
+    from const import LEAGUES
+    if league not in LEAGUES:
+        return jsonify({
+            "message": f"Unknown league {league}"
+        }), 404
+    events = get_feed(league).events(request.args.get('game_id'), request.args.get('player_id'))
+    return Response(stream_with_context(events), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no' # don't let a proxy buffer the stream
+    })
+
 if __name__=="__main__":
     app.run(debug=True)
     # json.dump(get_tables("nba_props"), open("nba_props.json", "w"), indent=4)
@@ -0,0 +1,77 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError: # brotli is optional, gzip is always available
+    brotli = None
+
+class CachedPayload:
+    """
+    Serialized JSON payload, compressed once and served as-is
+    """
+    def __init__(self, body: bytes):
+        self.identity: bytes = body
+        self.gzip: bytes = gzip.compress(body, compresslevel=6)
+        self.br: bytes = brotli.compress(body, quality=5) if brotli else None
+        self.etag: str = hashlib.sha1(body).hexdigest()
+        return
+    def get_encoded(self, accept_encodings):
+        options = ['br', 'gzip', 'identity'] if self.br else ['gzip', 'identity']
+        encoding = accept_encodings.best_match(options, default='identity')
+        if encoding == 'br':
+            return 'br', self.br
+        if encoding == 'gzip':
+            return 'gzip', self.gzip
+        return None, self.identity
+    def make_response(self, request):
+        """
+        304 when the client already has this version, otherwise the pre-compressed bytes.
+        Each content-coding gets its own strong ETag, If-None-Match uses weak comparison
+        """
+        encoding, body = self.get_encoded(request.accept_encodings)
+        etag = f"{self.etag}-{encoding or 'identity'}"
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': 'no-cache', # always revalidate with If-None-Match
+            'Vary': 'Accept-Encoding'
+        }
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers=headers)
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Response(body, status=200, mimetype='application/json', headers=headers)
+# END CachedPayload
+
+class PayloadCache:
+    """
+    LRU of CachedPayloads, keys include the fetch seqs of the data a payload was built from,
+    so a refresh means a new key and old payloads are never read again and age out
+    """
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        return
+    def get(self, key):
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+            return payload
+    def put(self, key, body: str):
+        payload = CachedPayload(body.encode('utf-8'))
+        with self.lock:
+            self.entries[key] = payload
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return payload
+# END PayloadCache
+
+PLAYER_PAYLOAD_CACHE = PayloadCache()
+GAMELOG_PAYLOAD_CACHE = PayloadCache()
\ No newline at end of file
@@ -0,0 +1,169 @@
+import json
+import queue
+import threading
+import time
+import logging
+from datetime import datetime
+
+from const import LEAGUES, PROPS_POLL_SECONDS, SSE_HEARTBEAT_SECONDS, SUBSCRIBER_QUEUE_SIZE
+from aws import get_props_by_date, get_props_downloaded_since
+
+# a line is identified by (player_id, stat, id), only these changing is pushed
+LINE_KEY = ['player_id', 'stat', 'id']
+LINE_FIELDS = ['line_value', 'over_odds', 'under_odds']
+
+RESYNC = None # queued when a subscriber falls behind (or subscribed before the first load), it gets a fresh snapshot instead
+
+def format_event(event: str, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class Subscription:
+    def __init__(self, game_id: str = None, player_id: str = None):
+        self.game_id = game_id
+        self.player_id = player_id
+        self.queue: queue.Queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # subscribed before the feed's first successful load, gets a snapshot once it loads
+        self.pending_snapshot = False
+        return
+    def matches(self, row: dict):
+        if self.game_id and row['id'] != self.game_id:
+            return False
+        if self.player_id and str(row['player_id']) != str(self.player_id):
+            return False
+        return True
+    def push(self, rows: list[dict]):
+        rows = [row for row in rows if self.matches(row)]
+        if not rows:
+            return
+        try:
+            self.queue.put_nowait(rows)
+        except queue.Full:
+            self.resync()
+        return
+    def resync(self):
+        # drop the backlog, the next event is a full snapshot
+        with self.queue.mutex:
+            self.queue.queue.clear()
+        self.queue.put_nowait(RESYNC)
+        return
+# END Subscription
+
+class LeaguePropsFeed:
+    """
+    Latest line per (player_id, stat, id) for a league's upcoming props. One poller thread per league
+    reads only newly downloaded rows and pushes changed lines to subscribers, it stops when nobody is subscribed
+    """
+    def __init__(self, league: str, poll_seconds: float = PROPS_POLL_SECONDS):
+        self.league = league
+        self.poll_seconds = poll_seconds
+        self.lines: dict[tuple, dict] = {}
+        self.last_downloaded: str = None
+        self.loaded = False # set after the first successful poll, even if it returned no lines
+        self.subscribers: set[Subscription] = set()
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.thread: threading.Thread = None
+        return
+    def get_new_rows(self):
+        today = datetime.now().date()
+        if self.last_downloaded is None:
+            df = get_props_by_date(self.league, today)
+        else:
+            df = get_props_downloaded_since(self.league, today, self.last_downloaded)
+        if df.empty:
+            return []
+        df = df.sort_values(by=['date_downloaded'], ascending=True)
+        df = df.drop_duplicates(subset=LINE_KEY, keep='last')
+        return json.loads(df.to_json(orient='records'))
+    def poll_once(self):
+        rows = self.get_new_rows()
+        today = str(datetime.now().date())
+        with self.lock:
+            changed = []
+            for row in rows:
+                key = tuple(row[k] for k in LINE_KEY)
+                prev = self.lines.get(key)
+                self.lines[key] = row
+                if prev is None or any(prev.get(f) != row.get(f) for f in LINE_FIELDS):
+                    changed.append(row)
+                if self.last_downloaded is None or row['date_downloaded'] > self.last_downloaded:
+                    self.last_downloaded = row['date_downloaded']
+            # games from previous days are no longer upcoming
+            self.lines = { key: row for key, row in self.lines.items() if row['bovada_date'] >= today }
+            if not self.loaded:
+                # the first load is the snapshot, only subscribers that were sent an empty one need it
+                self.loaded = True
+                for sub in self.subscribers:
+                    if sub.pending_snapshot:
+                        sub.pending_snapshot = False
+                        sub.resync()
+            elif changed:
+                for sub in self.subscribers:
+                    sub.push(changed)
+        return changed
+    def run(self):
+        while True:
+            try:
+                self.poll_once()
+                self.ready.set()
+            except Exception as e:
+                # ready stays unset, subscribers don't take the empty lines as a snapshot
+                logging.error(f"Error polling {self.league} props: {e}")
+            time.sleep(self.poll_seconds)
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    return
+    def get_snapshot(self, sub: Subscription):
+        with self.lock:
+            if not self.loaded:
+                sub.pending_snapshot = True
+            return [row for row in self.lines.values() if sub.matches(row)]
+    def subscribe(self, game_id: str = None, player_id: str = None):
+        """
+        Registers a subscriber, returns (subscription, current snapshot for its filters)
+        """
+        sub = Subscription(game_id, player_id)
+        with self.lock:
+            self.subscribers.add(sub)
+            if self.thread is None:
+                self.ready.clear()
+                self.thread = threading.Thread(target=self.run, daemon=True, name=f"{self.league}_props_feed")
+                self.thread.start()
+        self.ready.wait(timeout=self.poll_seconds)
+        return sub, self.get_snapshot(sub)
+    def unsubscribe(self, sub: Subscription):
+        with self.lock:
+            self.subscribers.discard(sub)
+        return
+    def events(self, game_id: str = None, player_id: str = None):
+        """
+        SSE stream: one snapshot event, then update events with only the changed lines
+        """
+        sub, snapshot = self.subscribe(game_id, player_id)
+        try:
+            yield format_event('snapshot', snapshot)
+            while True:
+                try:
+                    rows = sub.queue.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if rows is RESYNC:
+                    yield format_event('snapshot', self.get_snapshot(sub))
+                else:
+                    yield format_event('update', rows)
+        finally: # client disconnected
+            self.unsubscribe(sub)
+# END LeaguePropsFeed
+
+FEEDS: dict[str, LeaguePropsFeed] = {}
+FEEDS_LOCK = threading.Lock()
+
+def get_feed(league: str):
+    if league not in LEAGUES:
+        raise ValueError(f"Unknown league: {league}")
+    with FEEDS_LOCK:
+        if league not in FEEDS:
+            FEEDS[league] = LeaguePropsFeed(league)
+        return FEEDS[league]
\ No newline at end of file
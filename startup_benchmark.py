@@ -0,0 +1,74 @@
+import subprocess
+import sys
+import os
+import time
+import json
+import argparse
+import statistics
+import tempfile
+
+# modules that should only be imported by the routes that need them
+HEAVY_MODULES = [
+    'pandas', 'numpy', 'boto3', 'awswrangler', 'simplejson',
+    'nba_api.stats.endpoints', 'PlayerDataObj', 'bets', 'aws'
+]
+
+IMPORT_SNIPPET = """
+import sys, time, json
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    'elapsed': elapsed,
+    'loaded': [m for m in %r if m in sys.modules]
+}))
+"""
+
+def time_import(module_snippet: str):
+    """
+    Import main in a fresh interpreter, return (wall time of the whole process, import time, heavy modules loaded)
+    """
+    env = dict(os.environ)
+    env.setdefault('DEBUG_MODE', 'False')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), env.get('PYTHONPATH')]))
+    # temporary cwd, setup_logging() would otherwise truncate the running server's runtime_log.log
+    with tempfile.TemporaryDirectory() as cwd:
+        start = time.perf_counter()
+        res = subprocess.run([sys.executable, '-c', module_snippet], capture_output=True, text=True, env=env, cwd=cwd)
+        wall = time.perf_counter() - start
+    if res.returncode != 0:
+        raise RuntimeError(f"Importing main failed:\n{res.stderr}")
+    data = json.loads(res.stdout.strip().splitlines()[-1])
+    return wall, data['elapsed'], data['loaded']
+
+def run(runs: int, budget: float):
+    snippet = IMPORT_SNIPPET % HEAVY_MODULES
+    walls, imports, loaded = [], [], []
+    for _ in range(runs):
+        wall, elapsed, loaded = time_import(snippet)
+        walls.append(wall)
+        imports.append(elapsed)
+    res = {
+        'runs': runs,
+        'budget': budget,
+        'import_median': round(statistics.median(imports), 4),
+        'import_max': round(max(imports), 4),
+        'process_median': round(statistics.median(walls), 4),
+        'heavy_modules_loaded': loaded
+    }
+    print(json.dumps(res, indent=4))
+    failed = False
+    if res['import_median'] > budget:
+        print(f"FAIL: median import time {res['import_median']}s is over the {budget}s startup budget")
+        failed = True
+    if loaded:
+        print(f"FAIL: heavy modules imported at startup: {loaded}")
+        failed = True
+    return 1 if failed else 0
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="Time a cold import of main.py and check it against a startup budget")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=float(os.environ.get('STARTUP_BUDGET_SECONDS', 1.0)), help="max median import time in seconds")
+    args = parser.parse_args()
+    sys.exit(run(args.runs, args.budget))
\ No newline at end of file